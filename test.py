@@ -1,54 +1,242 @@
 import ezdxf
+from ezdxf.addons import iterdxf
+from ezdxf.entities import LWPolyline, Polyline, Text
 import matplotlib.pyplot as plt
 from matplotlib.patches import Polygon
 import matplotlib.collections as mcollections
 import numpy as np
 import math
+from array import array
+from collections import defaultdict
+from dataclasses import dataclass, field
+
+
+class CoordinateBuffer:
+    """Flat X and Y columns holding the vertices of every collected entity."""
+
+    def __init__(self):
+        self.xs = array('d')
+        self.ys = array('d')
+
+    def __len__(self):
+        return len(self.xs)
+
+    def add(self, coords):
+        """Append the vertices of one entity and return its (start, end) offsets."""
+        start = len(self.xs)
+        for x, y in coords:
+            self.xs.append(x)
+            self.ys.append(y)
+        return start, len(self.xs)
+
+    def coords(self, start, end):
+        """Return the vertices between two offsets as an (N, 2) array."""
+        return np.column_stack((self.xs[start:end], self.ys[start:end]))
+
+    def columns(self):
+        """Return NumPy views of the X and Y columns (do not add entities while they are held)."""
+        return np.frombuffer(self.xs, dtype=np.float64), np.frombuffer(self.ys, dtype=np.float64)
+
+
+@dataclass(slots=True)
+class LineEntity:
+    """A collected DXF entity whose vertices live in a shared CoordinateBuffer."""
+    buffer: CoordinateBuffer = field(repr=False)
+    start_off: int
+    end_off: int
+    entity_type: str
+    is_closed: bool = False
+    text: str = ''
+
+    def coords(self):
+        """Return this entity's vertices as an (N, 2) array."""
+        return self.buffer.coords(self.start_off, self.end_off)
+
+
+def horizontal_or_vertical_mask(buffer, lines, tolerance=1.0):
+    """Check which lines are horizontal or vertical within tolerance, returning one boolean per line."""
+    starts = np.fromiter((line.start_off for line in lines), dtype=np.intp, count=len(lines))
+    ends = np.fromiter((line.end_off for line in lines), dtype=np.intp, count=len(lines)) - 1
+    xs, ys = buffer.columns()
+    dx = xs[ends] - xs[starts]
+    dy = ys[ends] - ys[starts]
+
+    # Horizontal (delta Y is small) or vertical (delta X is small); single points are neither
+    return (ends > starts) & ((np.abs(dy) <= tolerance) | (np.abs(dx) <= tolerance))
+
+
+def point_segment_sq_distances(px, py, x1, y1, x2, y2):
+    """Calculate squared distance from points to line segments, elementwise over broadcastable arrays."""
+    # Work on separate X/Y columns so every operation runs across points rather than coordinate pairs
+    ex = x2 - x1
+    ey = y2 - y1
+    len_sq = ex * ex + ey * ey
+    dx = px - x1
+    dy = py - y1
+    # Treat as point if segment is very short
+    t = np.where(len_sq < 1e-12, 0.0, (dx * ex + dy * ey) / np.maximum(len_sq, 1e-12))
+    t = np.clip(t, 0, 1)
+    cx = dx - t * ex
+    cy = dy - t * ey
+    return cx * cx + cy * cy
+
+
+def expand_ranges(starts, stops):
+    """Enumerate every index of the half-open ranges [starts[i], stops[i]).
+
+    Returns two arrays: the range number i and the index itself, one entry per enumerated index.
+    """
+    counts = np.maximum(stops - starts, 0)
+    owners = np.repeat(np.arange(len(counts)), counts)
+    first = np.cumsum(counts) - counts
+    return owners, np.repeat(starts, counts) + np.arange(counts.sum()) - np.repeat(first, counts)
+
+
+def build_point_index(points):
+    """Sort points by X so that X ranges can be looked up with a binary search."""
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    return points[np.argsort(points[:, 0], kind='stable')]
+
+
+def lines_near_points_mask(buffer, lines, sorted_points, distance):
+    """Check which lines pass within distance of any indexed point, returning one boolean per line.
+
+    Candidate (point, segment) pairs of all lines are gathered from the point index and
+    tested in a single batch instead of line by line.
+    """
+    starts = np.fromiter((line.start_off for line in lines), dtype=np.intp, count=len(lines))
+    ends = np.fromiter((line.end_off for line in lines), dtype=np.intp, count=len(lines))
+    xs, ys = buffer.columns()
+
+    if np.all(ends - starts == 2):
+        # Only plain two-point lines (the common case), each is exactly one segment
+        seg_owner, seg_start = np.arange(len(lines)), starts
+    else:
+        # Every segment of every line starts at a vertex that is not the line's last one
+        seg_owner, seg_start = expand_ranges(starts, ends - 1)
+    x1, y1 = xs[seg_start], ys[seg_start]
+    x2, y2 = xs[seg_start + 1], ys[seg_start + 1]
+    min_x, max_x = np.minimum(x1, x2), np.maximum(x1, x2)
+    min_y, max_y = np.minimum(y1, y2), np.maximum(y1, y2)
+
+    # Only points within distance of a segment's X extent can be close enough
+    lo = np.searchsorted(sorted_points[:, 0], min_x - distance, side='left')
+    hi = np.searchsorted(sorted_points[:, 0], max_x + distance, side='right')
+    pair_seg, pair_point = expand_ranges(lo, hi)
+
+    # Reject points whose distance to the segment's bounding box already exceeds distance,
+    # before any projection math. Distance to a box is a lower bound of distance to the segment
+    px = sorted_points[pair_point, 0]
+    py = sorted_points[pair_point, 1]
+    out_x = np.maximum(np.maximum(min_x[pair_seg] - px, px - max_x[pair_seg]), 0)
+    out_y = np.maximum(np.maximum(min_y[pair_seg] - py, py - max_y[pair_seg]), 0)
+    near_box = out_x * out_x + out_y * out_y <= distance * distance
+    pair_seg, px, py = pair_seg[near_box], px[near_box], py[near_box]
+
+    # Compare squared distances, the square root is never needed
+    dist_sq = point_segment_sq_distances(px, py, x1[pair_seg], y1[pair_seg], x2[pair_seg], y2[pair_seg])
+    mask = np.zeros(len(lines), dtype=bool)
+    mask[seg_owner[pair_seg[dist_sq <= distance * distance]]] = True
+    return mask
+
+
+def build_endpoint_grid(lines, cell_size):
+    """Bucket line endpoints into square grid cells, mapping each cell to the indices of its lines."""
+    grid = defaultdict(list)
+    for index, line in enumerate(lines):
+        coords = line.coords()
+        for x, y in (coords[0], coords[-1]):
+            grid[(math.floor(x / cell_size), math.floor(y / cell_size))].append(index)
+    return grid
+
+
+def lines_near_point(grid, point, cell_size):
+    """Return indices of lines with an endpoint in the 3x3 grid cells around a point."""
+    cell_x = math.floor(point[0] / cell_size)
+    cell_y = math.floor(point[1] / cell_size)
+    indices = set()
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            indices.update(grid.get((cell_x + dx, cell_y + dy), ()))
+    return indices
 
 
-def is_horizontal_or_vertical(coords, tolerance=1.0):
-    """Check if a line is horizontal or vertical within tolerance."""
-    if len(coords) < 2:
-        return False
+def line_segments_are_connected(line1_coords, line2_coords, tolerance=2.0):
+    """Check if two line segments are connected (share an endpoint within tolerance)."""
+    (ax1, ay1), (ax2, ay2) = line1_coords[0], line1_coords[-1]
+    (bx1, by1), (bx2, by2) = line2_coords[0], line2_coords[-1]
+    tol_sq = tolerance * tolerance
+    return ((ax1 - bx1) ** 2 + (ay1 - by1) ** 2 <= tol_sq or
+            (ax1 - bx2) ** 2 + (ay1 - by2) ** 2 <= tol_sq or
+            (ax2 - bx1) ** 2 + (ay2 - by1) ** 2 <= tol_sq or
+            (ax2 - bx2) ** 2 + (ay2 - by2) ** 2 <= tol_sq)
 
-    x1, y1 = coords[0]
-    x2, y2 = coords[-1]
 
-    # Check if horizontal (delta Y is small)
-    if abs(y2 - y1) <= tolerance:
-        return True
-    # Check if vertical (delta X is small)
-    if abs(x2 - x1) <= tolerance:
-        return True
+def drop_repeated_vertices(coord_arr):
+    """Remove consecutive duplicate vertices from an (N, 2) array, keeping at least two."""
+    keep = np.ones(len(coord_arr), dtype=bool)
+    keep[1:] = np.any(coord_arr[1:] != coord_arr[:-1], axis=1)
+    if keep.sum() < 2 <= len(coord_arr):
+        # A polyline collapsed onto one point still stays a (zero-length) segment
+        keep[-1] = True
+    return coord_arr[keep]
 
-    return False
 
+def lwpolyline_coords(entity):
+    """Extract LWPOLYLINE vertices."""
+    return list(entity.get_points(format='xy'))
 
-def distance_point_to_line_segment(px, py, x1, y1, x2, y2):
-    """Calculate distance from point to line segment."""
-    line_mag_sq = (x2 - x1) ** 2 + (y2 - y1) ** 2
-    if line_mag_sq < 1e-12:  # Treat as point if segment is very short
-        return math.hypot(px - x1, py - y1)
-    t = max(0, min(1, ((px - x1) * (x2 - x1) + (py - y1) * (y2 - y1)) / line_mag_sq))
-    closest_x = x1 + t * (x2 - x1)
-    closest_y = y1 + t * (y2 - y1)
-    return math.hypot(px - closest_x, py - closest_y)
 
+def polyline_coords(entity):
+    """Extract POLYLINE vertices."""
+    return [(point[0], point[1]) for point in entity.points()]
 
-def line_segments_are_connected(line1_coords, line2_coords, tolerance=2.0):
-    """Check if two line segments are connected (share an endpoint within tolerance)."""
-    for p1 in [line1_coords[0], line1_coords[-1]]:
-        for p2 in [line2_coords[0], line2_coords[-1]]:
-            if math.hypot(p1[0] - p2[0], p1[1] - p2[1]) <= tolerance:
-                return True
-    return False
+
+def point_coords(entity):
+    """Extract the location of a POINT."""
+    return [(entity.dxf.location.x, entity.dxf.location.y)]
+
+
+def text_coords(entity):
+    """Extract the insertion point of a TEXT or MTEXT."""
+    return [(entity.dxf.insert.x, entity.dxf.insert.y)]
+
+
+# Coordinate extraction per DXF type, LINEs are collected separately as columns
+DXFTYPE_HANDLERS = {
+    'LWPOLYLINE': lwpolyline_coords,
+    'POLYLINE': polyline_coords,
+    'POINT': point_coords,
+    'TEXT': text_coords,
+    'MTEXT': text_coords,
+}
+
+# Every entity type that is parsed from the file, everything else is skipped while streaming
+STREAMED_TYPES = ['LINE', *DXFTYPE_HANDLERS]
+
+
+def open_modelspace(filename, types):
+    """Open a DXF file for reading the modelspace entities of the given types.
+
+    ASCII files are streamed with iterdxf. iterdxf cannot parse binary DXF, so files it rejects
+    are loaded whole with ezdxf.readfile, which still raises for files that are really corrupt.
+    Returns the entity iterable and a function that releases the file.
+    """
+    try:
+        doc = iterdxf.opendxf(filename)
+    except ezdxf.DXFStructureError:
+        msp = ezdxf.readfile(filename).modelspace()
+        return msp.query(' '.join(types)), lambda: None
+    return doc.modelspace(types=types), doc.close
 
 
 def main():
     DXF_FILE = "sample.dxf"
+    OUTPUT_FILE = None  # e.g. "wall_detection.png" to save the plot instead of showing it
 
     try:
-        doc = ezdxf.readfile(DXF_FILE)
+        # Stream entities from the file instead of loading the whole document into memory
+        entities, close_dxf = open_modelspace(DXF_FILE, STREAMED_TYPES)
     except IOError:
         print(f"Error: Cannot open DXF file: {DXF_FILE}")
         exit(1)
@@ -59,8 +247,6 @@ def main():
         print(f"An unexpected error occurred while reading the DXF file: {e}")
         exit(1)
 
-    msp = doc.modelspace()
-
     # Define target layers
     target_layers = {
         '8-1': 'doors',  # doors
@@ -75,80 +261,86 @@ def main():
 
     # Step 1: Collect all 8-F dots (wall center points)
     wall_center_dots = []
+    entity_coords = CoordinateBuffer()
     wall_boundary_lines = []
     door_lines = []
     labelling_entities = []
     polls_entities = []
 
-    all_plot_points_x = []
-    all_plot_points_y = []
-
-    for entity in msp:
-        if not (hasattr(entity, 'dxf') and hasattr(entity.dxf, 'layer')):
-            continue
-
-        layer = entity.dxf.layer
-        if layer not in target_layers:
-            continue
-
-        coords = []
-
-        # Extract coordinates based on entity type
-        if entity.dxftype() == 'LINE':
-            start = entity.dxf.start
-            end = entity.dxf.end
-            coords = [(start.x, start.y), (end.x, end.y)]
-        elif entity.dxftype() == 'LWPOLYLINE':
-            coords = [(point[0], point[1]) for point in entity.get_points()]
-        elif entity.dxftype() == 'POLYLINE':
-            coords = [(point[0], point[1]) for point in entity.points()]
-        elif entity.dxftype() == 'POINT':
-            coords = [(entity.dxf.location.x, entity.dxf.location.y)]
-        elif entity.dxftype() in ('TEXT', 'MTEXT'):
-            coords = [(entity.dxf.insert.x, entity.dxf.insert.y)]
-
-        if not coords:
-            continue
-
-        # Filter by X coordinate range
-        entity_in_range = any(render_xlim[0] <= x <= render_xlim[1] for x, y in coords)
-        if not entity_in_range:
-            continue
+    # Y coordinates of every in-range vertex, one array per entity, for Y axis scaling
+    plot_points_y = []
 
-        # Collect points for Y axis scaling
-        for p_x, p_y in coords:
-            if render_xlim[0] <= p_x <= render_xlim[1]:
-                all_plot_points_x.append(p_x)
-                all_plot_points_y.append(p_y)
+    # LINE endpoints as columns, filtered all at once after streaming
+    line_layers = []
+    line_start_x, line_start_y, line_end_x, line_end_y = array('d'), array('d'), array('d'), array('d')
 
-        # Categorize entities by layer
+    def collect(layer, dxftype, coords, is_closed=False, text=''):
+        """Categorize an entity inside the render range by its layer."""
         if layer == '8-F':  # Wall center dots
             for coord in coords:
                 wall_center_dots.append(coord)
-        elif layer == '8-4':  # Potential wall boundaries
-            wall_boundary_lines.append({
-                'coordinates': coords,
-                'entity_type': entity.dxftype(),
-                'is_closed': getattr(entity, 'is_closed', False)
-            })
+            return
+
+        start_off, end_off = entity_coords.add(coords)
+        if layer == '8-4':  # Potential wall boundaries
+            wall_boundary_lines.append(LineEntity(entity_coords, start_off, end_off, dxftype, is_closed=is_closed))
         elif layer == '8-1':  # Door lines
-            door_lines.append({
-                'coordinates': coords,
-                'entity_type': entity.dxftype(),
-                'is_closed': getattr(entity, 'is_closed', False)
-            })
+            door_lines.append(LineEntity(entity_coords, start_off, end_off, dxftype, is_closed=is_closed))
         elif layer == '8-2':  # Labelling
-            labelling_entities.append({
-                'coordinates': coords,
-                'entity_type': entity.dxftype(),
-                'text': getattr(entity.dxf, 'text', '') if hasattr(entity.dxf, 'text') else ''
-            })
+            labelling_entities.append(LineEntity(entity_coords, start_off, end_off, dxftype, text=text))
         elif layer == '8-3':  # Polls
-            polls_entities.append({
-                'coordinates': coords,
-                'entity_type': entity.dxftype(),
-                'is_closed': getattr(entity, 'is_closed', False)
-            })
+            polls_entities.append(LineEntity(entity_coords, start_off, end_off, dxftype, is_closed=is_closed))
+
+    try:
+        for entity in entities:
+            layer = entity.dxf.layer
+            if layer not in target_layers:
+                continue
+
+            dxftype = entity.dxftype()
+            if dxftype == 'LINE':
+                start = entity.dxf.start
+                end = entity.dxf.end
+                line_layers.append(layer)
+                line_start_x.append(start.x)
+                line_start_y.append(start.y)
+                line_end_x.append(end.x)
+                line_end_y.append(end.y)
+                continue
+
+            coords = DXFTYPE_HANDLERS[dxftype](entity)
+            if not coords:
+                continue
+
+            # Filter by X coordinate range
+            coord_arr = np.asarray(coords, dtype=np.float64)
+            if dxftype in ('LWPOLYLINE', 'POLYLINE'):
+                # Repeated vertices (snapped in the source CAD tool) only add zero-length segments
+                coords = coord_arr = drop_repeated_vertices(coord_arr)
+            in_range = (coord_arr[:, 0] >= render_xlim[0]) & (coord_arr[:, 0] <= render_xlim[1])
+            if not in_range.any():
+                continue
+
+            # Collect points for Y axis scaling
+            plot_points_y.append(coord_arr[in_range, 1])
+
+            # MTEXT keeps its content outside of the dxf namespace, only TEXT carries dxf.text
+            collect(layer, dxftype, coords,
+                    is_closed=isinstance(entity, (LWPolyline, Polyline)) and entity.is_closed,
+                    text=entity.dxf.text if isinstance(entity, Text) else '')
+    finally:
+        close_dxf()
+
+    # Filter all LINEs by X coordinate range in one pass
+    start_x, start_y, end_x, end_y = (np.frombuffer(column, dtype=np.float64) for column in
+                                      (line_start_x, line_start_y, line_end_x, line_end_y))
+    start_in_range = (start_x >= render_xlim[0]) & (start_x <= render_xlim[1])
+    end_in_range = (end_x >= render_xlim[0]) & (end_x <= render_xlim[1])
+    # Empty selections are skipped so the default Y range still applies when nothing is in range
+    plot_points_y.extend(ys for ys in (start_y[start_in_range], end_y[end_in_range]) if ys.size)
+
+    for i in np.nonzero(start_in_range | end_in_range)[0]:
+        collect(line_layers[i], 'LINE', [(start_x[i], start_y[i]), (end_x[i], end_y[i])])
 
     print(f"Found {len(wall_center_dots)} wall center dots (8-F)")
     print(f"Found {len(wall_boundary_lines)} potential wall boundary lines (8-4)")
@@ -157,54 +349,46 @@ def main():
 
     # Step 2: Filter 8-4 lines that are 1.5 units away from 8-F dots
     WALL_DETECTION_DISTANCE = 1.5
-    validated_wall_boundaries = []
 
-    for wall_line in wall_boundary_lines:
-        coords = wall_line['coordinates']
+    dot_index = build_point_index(wall_center_dots)
 
-        # Only keep horizontal or vertical lines
-        if not is_horizontal_or_vertical(coords, tolerance=2.0):
-            continue
+    # Only keep horizontal or vertical lines
+    wall_is_hv = horizontal_or_vertical_mask(entity_coords, wall_boundary_lines, tolerance=2.0)
+    hv_wall_lines = [wall_boundary_lines[i] for i in np.nonzero(wall_is_hv)[0]]
 
-        # Check if this line is within 1.5 units of any wall center dot
-        line_near_wall_center = False
-
-        for dot_x, dot_y in wall_center_dots:
-            if len(coords) >= 2:
-                # For lines, check distance to line segment
-                min_dist = float('inf')
-                for i in range(len(coords) - 1):
-                    x1, y1 = coords[i]
-                    x2, y2 = coords[i + 1]
-                    dist = distance_point_to_line_segment(dot_x, dot_y, x1, y1, x2, y2)
-                    min_dist = min(min_dist, dist)
-
-                if min_dist <= WALL_DETECTION_DISTANCE:
-                    line_near_wall_center = True
-                    break
-
-        if line_near_wall_center:
-            validated_wall_boundaries.append(wall_line)
+    # Check which lines are within 1.5 units of any wall center dot, all lines in one batch
+    near_wall_center = lines_near_points_mask(entity_coords, hv_wall_lines, dot_index, WALL_DETECTION_DISTANCE)
+    validated_wall_boundaries = [line for line, near in zip(hv_wall_lines, near_wall_center) if near]
 
     print(f"Validated {len(validated_wall_boundaries)} wall boundary lines near wall centers")
 
     # Step 3: Filter 8-1 door lines - keep only horizontal/vertical ones connected to wall boundaries
+    DOOR_CONNECTION_TOLERANCE = 3.0
     validated_door_lines = []
 
-    for door_line in door_lines:
-        coords = door_line['coordinates']
+    # Cells as large as the tolerance, so any endpoint within reach is in a neighbouring cell
+    wall_endpoint_grid = build_endpoint_grid(validated_wall_boundaries, DOOR_CONNECTION_TOLERANCE)
+    # CAD lines usually share their endpoints exactly, which only needs a set lookup
+    wall_endpoints = {tuple(point) for wall in validated_wall_boundaries for point in wall.coords()[[0, -1]]}
 
-        # Only keep horizontal or vertical lines
-        if not is_horizontal_or_vertical(coords, tolerance=2.0):
-            continue
+    # Only keep horizontal or vertical lines
+    door_is_hv = horizontal_or_vertical_mask(entity_coords, door_lines, tolerance=2.0)
 
-        # Check if this door line is connected to any validated wall boundary
-        connected_to_wall = False
+    for i in np.nonzero(door_is_hv)[0]:
+        door_line = door_lines[i]
+        coords = door_line.coords()
 
-        for wall_boundary in validated_wall_boundaries:
-            if line_segments_are_connected(coords, wall_boundary['coordinates'], tolerance=3.0):
-                connected_to_wall = True
-                break
+        if tuple(coords[0]) in wall_endpoints or tuple(coords[-1]) in wall_endpoints:
+            validated_door_lines.append(door_line)
+            continue
+
+        # Check if this door line is connected to any validated wall boundary near its endpoints
+        candidate_walls = (lines_near_point(wall_endpoint_grid, coords[0], DOOR_CONNECTION_TOLERANCE) |
+                           lines_near_point(wall_endpoint_grid, coords[-1], DOOR_CONNECTION_TOLERANCE))
+        connected_to_wall = any(
+            line_segments_are_connected(coords, validated_wall_boundaries[wall_index].coords(),
+                                        tolerance=DOOR_CONNECTION_TOLERANCE)
+            for wall_index in candidate_walls)
 
         if connected_to_wall:
             validated_door_lines.append(door_line)
@@ -212,74 +396,67 @@ def main():
     print(f"Validated {len(validated_door_lines)} door lines connected to walls")
 
     # Step 4: Visualization
-    plt.figure(figsize=(150, 100))
+    if OUTPUT_FILE:
+        # Headless export, skip the GUI backend entirely
+        plt.switch_backend('Agg')
+
+    plt.figure(figsize=(15, 10), dpi=100)
     ax = plt.gca()
     ax.set_aspect('equal')
     ax.set_title(f'Wall Detection Analysis - {DXF_FILE}')
 
     # Render validated wall boundaries (8-4) in purple
-    for wall_boundary in validated_wall_boundaries:
-        coords = wall_boundary['coordinates']
-        if len(coords) >= 2:
-            xs, ys = zip(*coords)
-            ax.plot(xs, ys, color='purple', linewidth=3,
-                    label='Wall Boundaries' if 'Wall Boundaries' not in [t.get_text() for t in
-                                                                         ax.texts] else "_nolegend_")
+    wall_segments = [coords for coords in (w.coords() for w in validated_wall_boundaries) if len(coords) >= 2]
+    if wall_segments:
+        ax.add_collection(mcollections.LineCollection(wall_segments, colors='purple', linewidths=3,
+                                                      label='Wall Boundaries', rasterized=True))
 
     # Render validated door lines (8-1) in light blue
-    for door_line in validated_door_lines:
-        coords = door_line['coordinates']
-        if len(coords) >= 2:
-            xs, ys = zip(*coords)
-            ax.plot(xs, ys, color='lightblue', linewidth=2,
-                    label='Doors' if 'Doors' not in [t.get_text() for t in ax.texts] else "_nolegend_")
+    door_segments = [coords for coords in (d.coords() for d in validated_door_lines) if len(coords) >= 2]
+    if door_segments:
+        ax.add_collection(mcollections.LineCollection(door_segments, colors='lightblue', linewidths=2,
+                                                      label='Doors', rasterized=True))
 
     # Render wall center dots (8-F) in red
-    for dot_x, dot_y in wall_center_dots:
-        ax.plot(dot_x, dot_y, 'ro', markersize=6,
-                label='Wall Centers' if 'Wall Centers' not in [t.get_text() for t in ax.texts] else "_nolegend_")
-
-    # Render all labelling entities (8-2) in red
-    for label_entity in labelling_entities:
-        coords = label_entity['coordinates']
-        entity_type = label_entity['entity_type']
-
-        if entity_type in ('TEXT', 'MTEXT'):
-            for x, y in coords:
-                ax.plot(x, y, 's', color='red', markersize=4,
-                        label='Labels' if 'Labels' not in [t.get_text() for t in ax.texts] else "_nolegend_")
-        else:
-            if len(coords) >= 2:
-                xs, ys = zip(*coords)
-                ax.plot(xs, ys, color='red', linewidth=1,
-                        label='Labels' if 'Labels' not in [t.get_text() for t in ax.texts] else "_nolegend_")
+    if wall_center_dots:
+        dot_xs, dot_ys = zip(*wall_center_dots)
+        ax.scatter(dot_xs, dot_ys, c='red', marker='o', s=36, label='Wall Centers', rasterized=True)
+
+    # Render all labelling entities (8-2) in red: text insertion points as markers, the rest as lines
+    label_points = [label.coords() for label in labelling_entities if label.entity_type in ('TEXT', 'MTEXT')]
+    label_segments = [coords for coords in (label.coords() for label in labelling_entities
+                                            if label.entity_type not in ('TEXT', 'MTEXT')) if len(coords) >= 2]
+    if label_points:
+        label_points = np.concatenate(label_points)
+        ax.scatter(label_points[:, 0], label_points[:, 1], c='red', marker='s', s=16,
+                   label='Labels', rasterized=True)
+    if label_segments:
+        ax.add_collection(mcollections.LineCollection(label_segments, colors='red', linewidths=1,
+                                                      label='_nolegend_' if len(label_points) else 'Labels',
+                                                      rasterized=True))
 
     # Render polls (8-3) in orange
-    for poll_entity in polls_entities:
-        coords = poll_entity['coordinates']
-        if len(coords) >= 2:
-            xs, ys = zip(*coords)
-            ax.plot(xs, ys, color='orange', linewidth=1.5,
-                    label='Polls' if 'Polls' not in [t.get_text() for t in ax.texts] else "_nolegend_")
+    poll_segments = [coords for coords in (p.coords() for p in polls_entities) if len(coords) >= 2]
+    if poll_segments:
+        ax.add_collection(mcollections.LineCollection(poll_segments, colors='orange', linewidths=1.5,
+                                                      label='Polls', rasterized=True))
 
     # Set plot limits
     ax.set_xlim(render_xlim)
 
-    if all_plot_points_y:
-        min_y, max_y = min(all_plot_points_y), max(all_plot_points_y)
+    if plot_points_y:
+        all_plot_points_y = np.concatenate(plot_points_y)
+        min_y, max_y = all_plot_points_y.min(), all_plot_points_y.max()
         height = max_y - min_y
         margin_y = height * 0.1 if height > 1e-6 else 10
         ax.set_ylim(min_y - margin_y, max_y + margin_y)
     else:
         ax.set_ylim(1800, 2200)
 
-    # Create legend
+    # Create legend, every category carries its label exactly once
     handles, labels = ax.get_legend_handles_labels()
     if handles:
-        # Remove duplicate labels
-        by_label = dict(zip(labels, handles))
-        ax.legend(by_label.values(), by_label.keys(),
-                  loc='upper left', bbox_to_anchor=(1.02, 1), borderaxespad=0.)
+        ax.legend(handles, labels, loc='upper left', bbox_to_anchor=(1.02, 1), borderaxespad=0.)
 
     plt.xlabel('X coordinate')
     plt.ylabel('Y coordinate')
@@ -293,7 +470,11 @@ def main():
     print(f"- Labels (8-2): {len(labelling_entities)}")
     print(f"- Polls (8-3): {len(polls_entities)}")
 
-    plt.show()
+    if OUTPUT_FILE:
+        plt.savefig(OUTPUT_FILE, dpi=300)
+        print(f"Saved plot to {OUTPUT_FILE}")
+    else:
+        plt.show()
 
 
 if __name__ == "__main__":
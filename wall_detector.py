@@ -1,14 +1,17 @@
 import ezdxf
+from ezdxf.addons import iterdxf
 import matplotlib.pyplot as plt
-from matplotlib.patches import Polygon
+from matplotlib.lines import Line2D
+from matplotlib.collections import LineCollection, PolyCollection
 import numpy as np
-import math
+from collections import defaultdict
 
 # ---------------------------
 # Configuration
 # ---------------------------
 
 DXF_FILE = "sample.dxf"
+OUTPUT_FILE = None  # e.g. "wall_detector.png" to save the plot instead of showing it
 
 # Legend extraction and mapping
 legend_mapping = {
@@ -19,9 +22,20 @@ legend_mapping = {
     "Windows": "A - GLAZ"
 }
 
+# Wall geometry types, classified by index so the loop branches on small ints
+WALL_ENTITY_TYPES = ('LINE', 'LWPOLYLINE', 'POLYLINE')
+LINE_KIND, LWPOLYLINE_KIND, POLYLINE_KIND = range(len(WALL_ENTITY_TYPES))
+wall_entity_kind = {dxftype: kind for kind, dxftype in enumerate(WALL_ENTITY_TYPES)}
+
+# Every entity type read from the file, wall geometry plus the texts that can label it
+STREAMED_TYPES = [*WALL_ENTITY_TYPES, 'TEXT', 'MTEXT']
+
 # Association distance threshold
 ASSOCIATION_DISTANCE_THRESHOLD = 200
 
+# Segments measured per batch during association, bounds the candidate pair temporaries
+ASSOCIATION_BLOCK_SIZE = 4096
+
 # Reverse legend mapping
 layer_to_type_name = {v: k for k, v in legend_mapping.items()}
 
@@ -44,21 +58,84 @@ default_ylim = (1800, 2200)
 # Utility functions
 # ---------------------------
 
-def distance_point_to_line_segment(px, py, x1, y1, x2, y2):
-    line_mag_sq = (x2 - x1) ** 2 + (y2 - y1) ** 2
-    if line_mag_sq < 1e-12:
-        return math.hypot(px - x1, py - y1)
-    t = max(0, min(1, ((px - x1) * (x2 - x1) + (py - y1) * (y2 - y1)) / line_mag_sq))
-    closest_x = x1 + t * (x2 - x1)
-    closest_y = y1 + t * (y2 - y1)
-    return math.hypot(px - closest_x, py - closest_y)
+def sq_distances_points_to_own_segments(points, segs):
+    # points: (K, 2), segs: (K, 2, 2) -> (K,) squared distance from each point to the segment paired with it
+    a = segs[:, 0, :]
+    d = segs[:, 1, :] - a
+    line_mag_sq = (d * d).sum(-1)
+    t = np.clip(((points - a) * d).sum(-1) / np.where(line_mag_sq < 1e-12, 1, line_mag_sq), 0, 1)
+    t = np.where(line_mag_sq < 1e-12, 0, t)
+    offset = points - (a + t[:, None] * d)
+    return (offset * offset).sum(-1)
+
+def expand_ranges(starts, stops):
+    # Every index of the half-open ranges [starts[i], stops[i]) -> (range number i, index) per entry
+    counts = np.maximum(stops - starts, 0)
+    owners = np.repeat(np.arange(len(counts)), counts)
+    first = np.cumsum(counts) - counts
+    return owners, np.repeat(starts, counts) + np.arange(counts.sum()) - np.repeat(first, counts)
+
+def nearest_labels(points, segs, entity_offsets, threshold, block_size=ASSOCIATION_BLOCK_SIZE):
+    # points: (N, 2), segs: (M, 2, 2) with entity k's segments starting at entity_offsets[k]
+    # -> (K,) index of the nearest point closer than threshold to each entity, -1 where there is none.
+    # On equal distances the lower point index wins
+    nearest = np.full(len(entity_offsets), -1)
+    if not len(points):
+        return nearest
+
+    # Points sorted by X, the points near a segment are found by binary search on its X extent
+    x_order = np.argsort(points[:, 0], kind='stable')
+    sorted_x = points[x_order, 0]
+
+    threshold_sq = threshold * threshold
+    entity_ends = np.append(entity_offsets[1:], len(segs))
+    segment_entity = np.repeat(np.arange(len(entity_offsets)), entity_ends - entity_offsets)
+    first = 0
+    while first < len(entity_offsets):
+        # Whole entities only, as many as fit in block_size segments but at least one
+        last = max(int(np.searchsorted(entity_ends, entity_offsets[first] + block_size, side='right')), first + 1)
+        lo, hi = entity_offsets[first], entity_ends[last - 1]
+        block_x = segs[lo:hi, :, 0]
+
+        pair_seg, pair_rank = expand_ranges(np.searchsorted(sorted_x, block_x.min(1) - threshold, side='left'),
+                                            np.searchsorted(sorted_x, block_x.max(1) + threshold, side='right'))
+        pair_seg += lo
+        pair_point = x_order[pair_rank]
+
+        # A segment is never closer than its bounding box, drop pairs whose box is already out of range
+        pair_xy = points[pair_point]
+        pair_segs = segs[pair_seg]
+        box_gap = np.maximum(np.maximum(pair_segs.min(1) - pair_xy, pair_xy - pair_segs.max(1)), 0)
+        near_box = (box_gap * box_gap).sum(-1) < threshold_sq
+        pair_seg, pair_point = pair_seg[near_box], pair_point[near_box]
+
+        # Squared distances rank the same as distances, the square root is never needed
+        dists_sq = sq_distances_points_to_own_segments(pair_xy[near_box], pair_segs[near_box])
+        in_range = dists_sq < threshold_sq
+        pair_entity, pair_point, dists_sq = segment_entity[pair_seg[in_range]], pair_point[in_range], dists_sq[in_range]
+
+        # Per entity, the closest pair first and the lower point index first among equals
+        order = np.lexsort((pair_point, dists_sq, pair_entity))
+        pair_entity, pair_point = pair_entity[order], pair_point[order]
+        is_first = np.ones(len(pair_entity), dtype=bool)
+        is_first[1:] = pair_entity[1:] != pair_entity[:-1]
+        nearest[pair_entity[is_first]] = pair_point[is_first]
+        first = last
+    return nearest
 
 # ---------------------------
-# Load DXF and extract entities
+# Open DXF
 # ---------------------------
 
 try:
-    doc = ezdxf.readfile(DXF_FILE)
+    try:
+        # Stream entities from the file instead of loading the whole document into memory
+        doc = iterdxf.opendxf(DXF_FILE)
+        entities, close_dxf = doc.modelspace(types=STREAMED_TYPES), doc.close
+    except ezdxf.DXFStructureError:
+        # iterdxf only parses ASCII DXF, load binary files whole (corrupt files still raise here)
+        entities = ezdxf.readfile(DXF_FILE).modelspace().query(' '.join(STREAMED_TYPES))
+        close_dxf = lambda: None
 except IOError:
     print(f"Cannot open DXF file: {DXF_FILE}")
     exit(1)
@@ -66,86 +143,97 @@ except ezdxf.DXFStructureError:
     print(f"Invalid or corrupted DXF file: {DXF_FILE}")
     exit(1)
 
-msp = doc.modelspace()
-
-potential_wall_entities = [e for e in msp if e.dxftype() in ('LINE', 'LWPOLYLINE', 'POLYLINE')]
-
-text_entities = []
-for e in msp.query('TEXT MTEXT'):
-    text_str = e.plain_text() if e.dxftype() == 'MTEXT' else e.dxf.text
-    text_entities.append({
-        'text': text_str.strip(),
-        'insert': (e.dxf.insert.x, e.dxf.insert.y)
-    })
-
 # ---------------------------
-# Classify entities
+# Extract and classify entities
 # ---------------------------
 
 classified_elements = []
+text_entities = []
 
-for entity in potential_wall_entities:
-    layer = entity.dxf.layer
-    element_type = layer_to_type_name.get(layer, "Unknown Wall")
-
-    coords = []
-    is_closed = False
-
-    if entity.dxftype() == 'LINE':
-        start = entity.dxf.start
-        end = entity.dxf.end
-        coords = [(start.x, start.y), (end.x, end.y)]
-    elif entity.dxftype() == 'LWPOLYLINE':
-        coords = [(point[0], point[1]) for point in entity.get_points()]
-        is_closed = entity.is_closed
-    elif entity.dxftype() == 'POLYLINE':
-        coords = [(point[0], point[1]) for point in entity.get_points()]
-        is_closed = entity.is_closed
-    else:
-        continue
-
-    if not coords:
-        continue
+# (index into classified_elements, segments) for every entity that can take a label
+entity_segments = []
 
-    assigned_label_text = None
-    min_dist_to_label = float('inf')
+# Wall geometry is classified by layer and texts are collected in one pass as the file streams past
+try:
+    for entity in entities:
+        dxftype = entity.dxftype()
+        kind = wall_entity_kind.get(dxftype)
+        if kind is None:
+            text_str = entity.plain_text() if dxftype == 'MTEXT' else entity.dxf.text
+            text_entities.append({
+                'text': text_str.strip(),
+                'insert': (entity.dxf.insert.x, entity.dxf.insert.y)
+            })
+            continue
+
+        layer = entity.dxf.layer
+        element_type = layer_to_type_name.get(layer, "Unknown Wall")
+
+        is_closed = False
+
+        # Vertices as one (N, 2) float array, shared by association and rendering
+        if kind == LINE_KIND:
+            start = entity.dxf.start
+            end = entity.dxf.end
+            coords = np.array([(start.x, start.y), (end.x, end.y)], dtype=np.float64)
+        elif kind == LWPOLYLINE_KIND:
+            coords = np.asarray(entity.get_points(format='xy'), dtype=np.float64).reshape(-1, 2)
+            is_closed = entity.is_closed
+        else:
+            # POLYLINE has no get_points(), points() yields the vertex locations in one call
+            coords = np.asarray([(point.x, point.y) for point in entity.points()], dtype=np.float64).reshape(-1, 2)
+            is_closed = entity.is_closed
 
-    for text_info in text_entities:
-        label_text_content = text_info['text']
-        label_px, label_py = text_info['insert']
+        if not len(coords):
+            continue
 
-        current_min_dist_to_entity = float('inf')
         if len(coords) == 2:
-            current_min_dist_to_entity = distance_point_to_line_segment(label_px, label_py, coords[0][0], coords[0][1],
-                                                                        coords[1][0], coords[1][1])
+            segs = coords[None]
         elif len(coords) > 2:
-            for i in range(len(coords)):
-                p1 = coords[i]
-                p2 = coords[(i + 1) % len(coords)]
-                dist_to_segment = distance_point_to_line_segment(label_px, label_py, p1[0], p1[1], p2[0], p2[1])
-                current_min_dist_to_entity = min(current_min_dist_to_entity, dist_to_segment)
-
-        if current_min_dist_to_entity < ASSOCIATION_DISTANCE_THRESHOLD and current_min_dist_to_entity < min_dist_to_label:
-            if label_text_content in legend_mapping:
-                assigned_label_text = label_text_content
-                min_dist_to_label = current_min_dist_to_entity
-
-    if assigned_label_text:
-        element_type = assigned_label_text
-
-    classified_elements.append({
-        'type': element_type,
-        'layer': layer,
-        'coordinates': coords,
-        'entity_type': entity.dxftype(),
-        'is_closed': is_closed
-    })
+            segs = np.stack([coords, np.roll(coords, -1, axis=0)], axis=1)
+        else:
+            segs = None
+
+        if segs is not None:
+            entity_segments.append((len(classified_elements), segs))
+
+        classified_elements.append({
+            'type': element_type,
+            'layer': layer,
+            'coordinates': coords,
+            'entity_type': WALL_ENTITY_TYPES[kind],
+            'is_closed': is_closed
+        })
+finally:
+    close_dxf()
+
+# Only labels naming a legend entry can be assigned, skip every other text up front
+legend_labels = [t for t in text_entities if t['text'] in legend_mapping]
+legend_label_texts = [t['text'] for t in legend_labels]
+legend_label_points = np.asarray([t['insert'] for t in legend_labels], dtype=np.float64).reshape(-1, 2)
+
+if entity_segments and legend_label_texts:
+    # All segments back to back, entity_offsets marks where each entity's run starts
+    entity_element_indices = np.asarray([element_index for element_index, _ in entity_segments])
+    segment_counts = np.asarray([len(segs) for _, segs in entity_segments])
+    entity_offsets = np.concatenate([[0], np.cumsum(segment_counts)[:-1]])
+    all_segs = np.concatenate([segs for _, segs in entity_segments])
+
+    # Nearest legend label within range of every entity, first label wins on a tie
+    nearest = nearest_labels(legend_label_points, all_segs, entity_offsets, ASSOCIATION_DISTANCE_THRESHOLD)
+    in_range = nearest >= 0
+
+    for element_index, label_index in zip(entity_element_indices[in_range], nearest[in_range]):
+        classified_elements[element_index]['type'] = legend_label_texts[label_index]
 
 # ---------------------------
 # Visualization with matplotlib
 # ---------------------------
 
-def plot_dxf(dpi, xlim, ylim):
+def plot_dxf(dpi, xlim, ylim, save_path=None):
+    if save_path:
+        # Headless export, skip the GUI backend entirely
+        plt.switch_backend('Agg')
     plt.figure(figsize=(15, 10), dpi=dpi)
     ax = plt.gca()
     ax.set_aspect('equal')
@@ -157,36 +245,43 @@ def plot_dxf(dpi, xlim, ylim):
                 horizontalalignment='center', verticalalignment='center',
                 transform=ax.transAxes, fontsize=12, color='red')
 
-    rendered_labels_legend = set()
+    # Group geometry by type so each type is drawn with one collection per shape
+    open_lines_by_type = defaultdict(list)
+    closed_polygons_by_type = defaultdict(list)
 
     for element in classified_elements:
         coords = element['coordinates']
         element_display_type = element['type']
-        color = color_map.get(element_display_type, 'black')
-        label_for_legend = element_display_type
-        if label_for_legend in rendered_labels_legend:
-            label_for_legend = "_nolegend_"
-        else:
-            rendered_labels_legend.add(label_for_legend)
-
         entity_type = element['entity_type']
         is_closed = element.get('is_closed', True)
 
         if entity_type == 'LINE' and len(coords) == 2:
-            xs, ys = zip(*coords)
-            ax.plot(xs, ys, color=color, linewidth=2, label=label_for_legend)
+            open_lines_by_type[element_display_type].append(coords)
         elif entity_type in ('LWPOLYLINE', 'POLYLINE') and len(coords) > 1:
             if not is_closed:
-                xs, ys = zip(*coords)
-                ax.plot(xs, ys, color=color, linewidth=2, label=label_for_legend)
+                open_lines_by_type[element_display_type].append(coords)
             else:
-                polygon = Polygon(coords, closed=True, fill=False, edgecolor=color, linewidth=2, label=label_for_legend)
-                ax.add_patch(polygon)
+                closed_polygons_by_type[element_display_type].append(coords)
 
-    handles, labels = ax.get_legend_handles_labels()
-    if handles:
-        by_label = dict(zip(labels, handles))
-        ax.legend(by_label.values(), by_label.keys(), loc='upper left', bbox_to_anchor=(1, 1))
+    # Types in order of first appearance, each with one proxy artist for the legend
+    legend_handles = []
+    for element_display_type in dict.fromkeys(element['type'] for element in classified_elements):
+        color = color_map.get(element_display_type, 'black')
+
+        open_lines = open_lines_by_type.get(element_display_type)
+        if open_lines:
+            ax.add_collection(LineCollection(open_lines, colors=color, linewidths=2))
+
+        closed_polygons = closed_polygons_by_type.get(element_display_type)
+        if closed_polygons:
+            ax.add_collection(PolyCollection(closed_polygons, closed=True,
+                                             facecolors='none', edgecolors=color, linewidths=2))
+
+        if open_lines or closed_polygons:
+            legend_handles.append(Line2D([], [], color=color, linewidth=2, label=element_display_type))
+
+    if legend_handles:
+        ax.legend(handles=legend_handles, loc='upper left', bbox_to_anchor=(1, 1))
 
     ax.set_xlabel('X coordinate')
     ax.set_ylabel('Y coordinate')
@@ -196,7 +291,12 @@ def plot_dxf(dpi, xlim, ylim):
     ax.set_ylim(ylim[0], ylim[1])
 
     plt.tight_layout(rect=[0, 0, 0.85, 1])
-    plt.show()
+    if save_path:
+        plt.savefig(save_path, dpi=dpi)
+        plt.close()
+        print(f"Saved plot to {save_path}")
+    else:
+        plt.show()
 
 # ---------------------------
 # User input for customization
@@ -228,4 +328,4 @@ except Exception as e:
 # Plot with user customization
 # ---------------------------
 
-plot_dxf(dpi, xlim, ylim)
+plot_dxf(dpi, xlim, ylim, OUTPUT_FILE)